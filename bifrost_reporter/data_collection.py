@@ -4,27 +4,81 @@
 from bifrost_reporter import data_processing
 import logging
 import pandas as pd
+import numpy as np
 import os
+import functools
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+# Result files Bifrost writes into each sample folder, as <sample_name><suffix>
+BIFROST_RESULTS = ["__amrfinderplus_fbi.yaml",
+                   "__ariba_mlst.yaml",
+                   "__ariba_plasmidfinder.yaml",
+                   "__ariba_resfinder.yaml",
+                   "__ariba_virulencefinder.yaml",
+                   "__assemblatron.yaml",
+                   "__kma_pointmutations.yaml",
+                   "__min_read_check.yaml",
+                   "__reslab_stamper.yaml",
+                   "__sp_cdiff_fbi.yaml",
+                   "__sp_ecoli_fbi.yaml",
+                   "__sp_salm_fbi.yaml",
+                   "__ssi_stamper.yaml",
+                   "__whats_my_species.yaml"]
+
+# Analysis name for each result file suffix, e.g. "__ariba_mlst.yaml" -> "ariba_mlst"
+_SUFFIX_TO_ANALYSIS = {suffix: suffix[2:-len(".yaml")] for suffix in BIFROST_RESULTS}
+
+# The Rust-based calamine engine (pandas >= 2.2) reads Excel sheets much
+# faster than openpyxl, use it when it is installed
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
 
 
 
 def retrieve_samples(sample_sheet_path):
     """
-    Reads an Excel sample sheet and builds full paths to each sample directory.
+    Reads an Excel (or CSV) sample sheet and builds full paths to each sample directory.
 
     Parameters:
     ----------
     sample_sheet_path : str
-        Path to the Excel file containing sample IDs
+        Path to the Excel or CSV file containing sample IDs
 
     Returns:
     -------
     pd.Series
         Series of full paths to sample directories
     """
-    df = pd.read_excel(sample_sheet_path)
-    df["SampleID"] = os.path.dirname(sample_sheet_path) + '/' + df["SampleID"].astype(str)
-    return df["SampleID"]
+    # Only the SampleID column is needed, read it as strings to skip type inference
+    read_kwargs = dict(usecols=["SampleID"], dtype={"SampleID": "string"})
+    if sample_sheet_path.endswith(".csv"):
+        df = pd.read_csv(sample_sheet_path, **read_kwargs)
+    else:
+        df = pd.read_excel(sample_sheet_path, engine=EXCEL_ENGINE, **read_kwargs)
+    sample_ids = df["SampleID"]
+    if sample_ids.isna().any():
+        logging.warning(f"Skipping {sample_ids.isna().sum()} row(s) without a SampleID in {sample_sheet_path}")
+        sample_ids = sample_ids.dropna()
+    return sample_ids.radd(os.path.dirname(sample_sheet_path) + '/')
+
+
+
+def _list_files(folder):
+    """
+    Lists the regular files in a directory with a single scandir call.
+
+    Parameters:
+    ----------
+    folder : str
+        Directory to list
+
+    Returns:
+    -------
+    set of str
+        Names of the files present in the directory
+    """
+    with os.scandir(folder) as entries:
+        return {entry.name for entry in entries if entry.is_file()}
 
 
 
@@ -39,52 +93,38 @@ def check_samples(folder_paths):
 
     Returns:
     -------
-    dict
-        A dictionary showing whether each sample directory and required files exist
+    pd.DataFrame
+        Boolean matrix with one row per sample directory and one column per
+        expected result file suffix (BIFROST_RESULTS). Rows of directories
+        that could not be found are all False.
     """
-    bifrost_results = ["__amrfinderplus_fbi.yaml", 
-                       "__ariba_mlst.yaml", 
-                       "__ariba_plasmidfinder.yaml",
-                       "__ariba_resfinder.yaml", 
-                       "__ariba_virulencefinder.yaml", 
-                       "__assemblatron.yaml",
-                       "__kma_pointmutations.yaml", 
-                       "__min_read_check.yaml", 
-                       "__reslab_stamper.yaml",
-                       "__sp_cdiff_fbi.yaml", 
-                       "__sp_ecoli_fbi.yaml", 
-                       "__sp_salm_fbi.yaml", 
-                       "__ssi_stamper.yaml", 
-                       "__whats_my_species.yaml"]
-
-    status = {}
-    for folder in folder_paths:
-        file_status = {}
-        sample_name = os.path.basename(folder)
-        
-        if os.path.isdir(folder):  # Check if folder exists
-            for result in bifrost_results:
-                file_name = sample_name + result
-                file_path = os.path.join(folder, file_name)
-                file_status[file_name] = os.path.isfile(file_path)  # Check if file exists
-        else:
-            logging.error(f"The folder : {folder} could not be found. Please check again")
-        
-        status[folder] = {
-            'exists': os.path.isdir(folder),
-            'files': file_status
-        }
-    return status
-
-
-
-def data_collection_from_dict(sample_dict):
+    folders = pd.Index(folder_paths)
+    exists = np.array([os.path.isdir(folder) for folder in folders], dtype=bool)
+    for folder in folders[~exists]:
+        logging.error(f"The folder : {folder} could not be found. Please check again")
+
+    # (n_samples, n_results) matrix of the file names expected in each folder
+    sample_names = np.array([os.path.basename(folder) for folder in folders], dtype=str)
+    expected = np.char.add(sample_names[:, None], np.array(BIFROST_RESULTS)[None, :])
+
+    # One directory listing per sample folder instead of a stat per expected file,
+    # listed on the file-loading pool the parsers share
+    present = np.zeros(expected.shape, dtype=bool)
+    existing = np.flatnonzero(exists)
+    for i, listing in zip(existing, data_processing._FILE_POOL.map(_list_files, folders[existing])):
+        present[i] = [file_name in listing for file_name in expected[i]]
+
+    return pd.DataFrame(present, index=folders, columns=BIFROST_RESULTS)
+
+
+
+def data_collection_from_dict(sample_status):
     """
     Gathers and processes data from YAML result files found in each sample directory.
 
     Parameters:
     ----------
-    sample_dict : dict
+    sample_status : pd.DataFrame
         Output from check_samples() containing file presence per sample
 
     Returns:
@@ -94,35 +134,41 @@ def data_collection_from_dict(sample_dict):
     """
     analysis_files = {}
 
-    for sample_path, sample_info in sample_dict.items():
-        if not sample_info["exists"]:
-            continue  # Skip if directory doesn't exist
-
-        for file_name, is_present in sample_info["files"].items():
-            if is_present:
-                try:
-                    analysis_name = file_name.strip(".yaml").split("__")[1]
-                    analysis_files.setdefault(analysis_name, []).append(os.path.join(sample_path, file_name))
-                except:
-                    continue  # Ignore parsing errors
-
-    # Parse different analysis results using the data_processing module
-    mlst_df = data_processing.parse_mlst(analysis_files.get("ariba_mlst", []))
-
-    plasmid_finder_df = data_processing.parse_finder_tools(analysis_files.get("ariba_plasmidfinder", []), "ariba_plasmidfinder")
-    plasmid_finder_df = plasmid_finder_df[(plasmid_finder_df["%COVERAGE"] >= 80) & (plasmid_finder_df["%IDENTITY"] >= 80)]
-
-    resfinder_df = data_processing.parse_finder_tools(analysis_files.get("ariba_resfinder", []), "ariba_resfinder")
-    resfinder_df = resfinder_df[(resfinder_df["%COVERAGE"] >= 60) & (resfinder_df["%IDENTITY"] >= 90)]
-
-    virulence_df = data_processing.parse_finder_tools(analysis_files.get("ariba_virulencefinder", []), "ariba_virulencefinder")
-    virulence_df = virulence_df[(virulence_df["%COVERAGE"] >= 60) & (virulence_df["%IDENTITY"] >= 90)]
-
-    assemblatron_df = data_processing.parse_assemblatron(analysis_files.get("assemblatron", []))
-    kma_df = data_processing.parse_kmapointmutations(analysis_files.get("kma_pointmutations", []))
-    amr_df = data_processing.parse_amrfinder(analysis_files.get("amrfinderplus_fbi", []))
-    ssi_stamper_df = data_processing.check_stampers(analysis_files.get("ssi_stamper", []))
-    reslab_stamper_df = data_processing.check_stampers(analysis_files.get("reslab_stamper", []))
+    for suffix in sample_status.columns:
+        folders = sample_status.index[sample_status[suffix].to_numpy()]
+        analysis_files[_SUFFIX_TO_ANALYSIS[suffix]] = [
+            os.path.join(folder, os.path.basename(folder) + suffix) for folder in folders]
+
+    # Parse different analysis results using the data_processing module. The
+    # parsers share no state, so they all run at the same time.
+    tasks = {
+        "mlst": (data_processing.parse_mlst, "ariba_mlst"),
+        "plasmid_finder": (functools.partial(data_processing.parse_finder_tools, ariba_type="ariba_plasmidfinder",
+                                             min_cov=80, min_id=80), "ariba_plasmidfinder"),
+        "resfinder": (functools.partial(data_processing.parse_finder_tools, ariba_type="ariba_resfinder",
+                                        min_cov=60, min_id=90), "ariba_resfinder"),
+        "virulence": (functools.partial(data_processing.parse_finder_tools, ariba_type="ariba_virulencefinder",
+                                        min_cov=60, min_id=90), "ariba_virulencefinder"),
+        "assemblatron": (data_processing.parse_assemblatron, "assemblatron"),
+        "kma": (data_processing.parse_kmapointmutations, "kma_pointmutations"),
+        "amr": (data_processing.parse_amrfinder, "amrfinderplus_fbi"),
+        "ssi_stamper": (data_processing.check_stampers, "ssi_stamper"),
+        "reslab_stamper": (data_processing.check_stampers, "reslab_stamper"),
+    }
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = {name: executor.submit(parser, analysis_files.get(analysis, []))
+                   for name, (parser, analysis) in tasks.items()}
+    results = {name: future.result() for name, future in futures.items()}
+
+    mlst_df = results["mlst"]
+    plasmid_finder_df = results["plasmid_finder"]
+    resfinder_df = results["resfinder"]
+    virulence_df = results["virulence"]
+    assemblatron_df = results["assemblatron"]
+    kma_df = results["kma"]
+    amr_df = results["amr"]
+    ssi_stamper_df = results["ssi_stamper"]
+    reslab_stamper_df = results["reslab_stamper"]
 
     return (mlst_df,
             plasmid_finder_df,
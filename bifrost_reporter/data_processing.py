@@ -1,7 +1,5 @@
 #!/usr/bin/env python
 
-import importlib
-import importlib.util
 import logging
 import pandas as pd
 from bson import ObjectId
@@ -10,6 +8,15 @@ import numpy as np
 import warnings
 import os
 import envyaml
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Prefer the libyaml-backed loader; fall back to the pure-Python one if
+# PyYAML was built without libyaml bindings
+try:
+    from yaml import CLoader as FastLoader, CSafeLoader as FastSafeLoader
+except ImportError:
+    from yaml import Loader as FastLoader, SafeLoader as FastSafeLoader
 
 
 # This script includes helper functions to parse and normalize various YAML outputs
@@ -26,35 +33,17 @@ import envyaml
 # ---------------
 # CONFIG LOADING
 # ---------------
-# Define the core package name used for relative configuration paths
-PACKAGE_NAME: str = "bifrost_reporter"
-
-# Dynamically locate the package and its directory for loading config files
-try:
-    spec = importlib.util.find_spec(PACKAGE_NAME)
-    if spec is None:
-        raise ModuleNotFoundError(f"Package '{PACKAGE_NAME}' not found.")
-
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    PACKAGE_DIR = os.path.dirname(module.__file__)  # Extract directory location
-
-except ModuleNotFoundError as e:
-    print(f"Error: {e}")
-    PACKAGE_DIR = None
-except AttributeError:
-    print(f"Error: Could not determine package directory for '{PACKAGE_NAME}'.")
-    PACKAGE_DIR = None
-except Exception as e:
-    print(f"Unexpected error: {e}")
-    PACKAGE_DIR = None
+# Directory of the package, used to locate the default config file
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 
+@functools.lru_cache(maxsize=8)
 def get_config(config_path: str = None):
     """
     Load specified YAML configuration file. If the path is None falls back to 
-    the default config in the package directory 
+    the default config in the package directory. Results are cached per path,
+    so the returned dict is shared between callers and must not be modified.
 
     Parameters:
     ----------
@@ -71,7 +60,7 @@ def get_config(config_path: str = None):
 
     try:
         with open(config_path, 'r') as file:
-            config = yaml.safe_load(file)
+            config = yaml.load(file, Loader=FastSafeLoader)
         return config
     except Exception as e:
         raise RuntimeError(f"Failed to load config file: {config_path}. Error: {str(e)}")
@@ -86,8 +75,140 @@ def bson_objectid_constructor(loader, node):
     value = loader.construct_scalar(node)
     return ObjectId(value)
 
-# Register the constructor for custom YAML tags
+# Register the constructor for custom YAML tags. The C loaders do not share
+# the constructor registry of the Python ones, so register against both.
 yaml.add_constructor('!bson.objectid.ObjectId', bson_objectid_constructor)
+yaml.add_constructor('!bson.objectid.ObjectId', bson_objectid_constructor, Loader=FastLoader)
+
+
+
+# ----------------------
+# YAML FILE LOADING
+# ----------------------
+# Used to turn plain scalars picked out of the event stream into the same
+# Python types PyYAML would give
+_SCALAR_RESOLVER = yaml.resolver.Resolver()
+_SCALAR_CONSTRUCTOR = yaml.constructor.SafeConstructor()
+
+
+def _plain_scalar(text):
+    """
+    Type a plain (unquoted) YAML scalar the way PyYAML's SafeLoader would.
+    """
+    tag = _SCALAR_RESOLVER.resolve(yaml.ScalarNode, text, (True, False))
+    return _SCALAR_CONSTRUCTOR.yaml_constructors[tag](_SCALAR_CONSTRUCTOR, yaml.ScalarNode(tag, text))
+
+
+def _tagged_scalar(tag, text):
+    """
+    Construct an explicitly tagged YAML scalar (!!float 3, !bson.objectid.ObjectId ...)
+    the way the loaders would. Scalars with an unknown tag are kept as strings.
+    """
+    if tag == '!bson.objectid.ObjectId':
+        return ObjectId(text)
+    constructor = _SCALAR_CONSTRUCTOR.yaml_constructors.get(tag)
+    if constructor is None:
+        return text
+    return constructor(_SCALAR_CONSTRUCTOR, yaml.ScalarNode(tag, text))
+
+
+def _fast_yaml_load(path):
+    """
+    Load a Bifrost YAML file with the libyaml-backed loader. Results are
+    cached on the file's modification time, so a file is only parsed again
+    once it changes.
+
+    Parameters:
+    ----------
+    path : str
+        Path to the YAML file.
+
+    Returns:
+    -------
+    dict
+        The decoded YAML document. It is shared between callers and must not
+        be modified.
+    """
+    return _load_cached(path, os.path.getmtime(path))
+
+
+
+@functools.lru_cache(maxsize=4096)
+def _load_cached(path, mtime):
+    """
+    Parse a YAML file. mtime is only part of the cache key.
+    """
+    with open(path, 'rb') as f:
+        return yaml.load(f, Loader=FastLoader)
+
+
+
+
+
+def _extract_scalars(path, keypaths):
+    """
+    Stream the events of a YAML file and pick out only the scalars found at
+    the given key paths. Unrelated subtrees are skipped without being
+    constructed, and reading stops once every key path has been found.
+
+    Parameters:
+    ----------
+    path : str
+        Path to the YAML file.
+    keypaths : set of tuple of str
+        Mapping key paths to extract, e.g. {("status",), ("sample", "name")}.
+
+    Returns:
+    -------
+    dict
+        Values keyed on key path, for the key paths present in the file.
+    """
+    # Collections on these paths may contain something we want
+    prefixes = {keypath[:i] for keypath in keypaths for i in range(len(keypath))}
+    found = {}
+    # One [is_mapping, key path or None if not of interest, pending key] per open collection
+    stack = []
+
+    def value_path():
+        if not stack:
+            return ()
+        is_mapping, collection_path, key = stack[-1]
+        if not is_mapping or collection_path is None:
+            return None
+        return collection_path + (key,)
+
+    def value_done():
+        if stack and stack[-1][0]:
+            stack[-1][2] = None
+
+    with open(path, 'rb') as f:
+        for event in yaml.parse(f, Loader=FastLoader):
+            if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+                collection_path = value_path()
+                if collection_path not in prefixes:
+                    collection_path = None
+                stack.append([isinstance(event, yaml.MappingStartEvent), collection_path, None])
+            elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+                stack.pop()
+                value_done()
+            elif isinstance(event, yaml.ScalarEvent):
+                if stack and stack[-1][0] and stack[-1][2] is None:
+                    stack[-1][2] = event.value  # mapping key
+                    continue
+                keypath = value_path()
+                if keypath in keypaths:
+                    if event.tag is not None:
+                        found[keypath] = _tagged_scalar(event.tag, event.value)
+                    elif event.implicit[0]:  # plain scalar
+                        found[keypath] = _plain_scalar(event.value)
+                    else:
+                        found[keypath] = event.value
+                    if len(found) == len(keypaths):
+                        break
+                value_done()
+            elif isinstance(event, yaml.AliasEvent):
+                value_done()
+    return found
 
 
 
@@ -97,25 +218,53 @@ yaml.add_constructor('!bson.objectid.ObjectId', bson_objectid_constructor)
 # PARSERS FOR DIFFERENT BIFROST TOOLS
 # ------------------------------------
 
+# One pool shared by all parsers, so running several parsers at once (as
+# data_collection_from_dict does) does not start a pool of threads for each
+_FILE_POOL = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+def _parallel_load(list_files, parse_one):
+    """
+    Apply parse_one to every file on the shared thread pool and collect the results.
+
+    Parameters:
+    ----------
+    list_files : list of str
+        Paths to the YAML files to parse.
+    parse_one : callable
+        Takes a file path and returns a (sample_name, payload) tuple. Files for
+        which the payload is None are left out of the result.
+
+    Returns:
+    -------
+    dict
+        Payloads keyed on sample name, in the same order as list_files.
+    """
+    d = {}
+    for name, payload in _FILE_POOL.map(parse_one, list_files):
+        if payload is not None:
+            d[name] = payload
+    return d
+
+
+
 def parse_mlst(list_files):
     """
     Parse MLST YAML files, extracting the 7 loci alleles and ST (sequence type).
     Returns a DataFrame with one row per sample.
     """
-    d = {}
-    for file in list_files:
-        with open(file) as f:
-            temp = yaml.load(f, Loader=yaml.Loader)
-            if temp["status"] == "Success":
-                d[temp["sample"]["name"]] = temp["summary"]["mlst_report"]
-            else:
-                d[temp["sample"]["name"]] = "N/A,N/A,N/A,N/A,N/A,N/A,N/A,N/A"
+    keypaths = {("status",), ("sample", "name"), ("summary", "mlst_report")}
 
-    # Split CSV-like MLST reports into list of 8 values (ST + 7 loci)
-    for key, value in d.items():
-        d[key] = value.split(',')
+    def parse_one(file):
+        temp = _extract_scalars(file, keypaths)
+        if temp.get(("status",)) == "Success":
+            return temp[("sample", "name")], temp[("summary", "mlst_report")]
+        return temp[("sample", "name")], "N/A,N/A,N/A,N/A,N/A,N/A,N/A,N/A"
 
-    df = pd.DataFrame.from_dict(d, orient='index', dtype=str)
+    d = _parallel_load(list_files, parse_one)
+
+    # Split CSV-like MLST reports into 8 columns (ST + 7 loci)
+    df = pd.DataFrame.from_dict(d, orient='index', columns=['raw'], dtype=str)
+    df = df['raw'].str.split(',', expand=True)
     df.columns = range(df.shape[1])
     return df
 
@@ -126,20 +275,21 @@ def parse_kmapointmutations(list_files):
     Extract point mutation data from KMA-based pointmutations_tsv reports.
     Returns a multi-indexed DataFrame with mutation records per sample.
     """
-    d = {}
-    for file in list_files:
-        with open(file) as f:
-            data = yaml.load(f, Loader=yaml.Loader)
-            if data["status"] == "Success":
-                summary = data.get("results", {}).get("pointmutations_tsv", {}).get("values", [])
-                if not summary:
-                    warnings.warn(f"Missing pointmutation summary for: {data['sample']['name']}")
-                    continue
-                df = pd.DataFrame.from_dict(summary)
-                d[data["sample"]["name"]] = df
+    def parse_one(file):
+        data = _fast_yaml_load(file)
+        if data["status"] != "Success":
+            return data["sample"]["name"], None
+        summary = data.get("results", {}).get("pointmutations_tsv", {}).get("values", [])
+        if not summary:
+            warnings.warn(f"Missing pointmutation summary for: {data['sample']['name']}")
+            return data["sample"]["name"], None
+        return data["sample"]["name"], summary
+
+    d = _parallel_load(list_files, parse_one)
     if d:
-        df = pd.concat(d, names=['Sample Name']).reset_index(level=0)
-        df = df.set_index("Sample Name").drop(columns=["#Sample"])
+        # One frame for all samples instead of a frame per sample plus a concat
+        rows = [{'Sample Name': name, **record} for name, summary in d.items() for record in summary]
+        df = pd.DataFrame(rows).set_index("Sample Name").drop(columns=["#Sample"])
     else:
         df = pd.DataFrame()
     return df
@@ -151,42 +301,59 @@ def check_stampers(list_files):
     Evaluate the quality control (QC) summary stamps from YAML.
     If all QC checks are 'pass', mark overall as 'Pass'.
     """
-    d = {}
-    for file in list_files:
-        with open(file) as f:
-            data = yaml.load(f, Loader=yaml.Loader)
-            if data["status"] == "Success":
-                summary = data.get("results", {})
-                df = pd.DataFrame.from_dict(summary)
-                d[data["sample"]["name"]] = "Pass" if df["status"].eq("pass").all() else "Fail"
+    def parse_one(file):
+        data = _fast_yaml_load(file)
+        if data["status"] == "Success":
+            summary = data.get("results", {})
+            # results holds either a column of statuses, check records keyed
+            # on check name or a list of check records
+            if isinstance(summary, dict) and "status" in summary:
+                statuses = summary["status"]
+                if isinstance(statuses, dict):
+                    statuses = statuses.values()
+            elif isinstance(summary, dict):
+                statuses = [check.get("status") for check in summary.values()]
             else:
-                d[data["sample"]["name"]] = "Requirement Not Met"
+                statuses = [check.get("status") for check in summary]
+            statuses = list(statuses)
+            # a stamp without any check status is never a pass
+            passed = bool(statuses) and all(status == "pass" for status in statuses)
+            return data["sample"]["name"], "Pass" if passed else "Fail"
+        return data["sample"]["name"], "Requirement Not Met"
+
+    d = _parallel_load(list_files, parse_one)
     return pd.DataFrame.from_dict(d, orient='index')
 
 
 
+# Columns of the AMRFinderPlus output_tsv table
+AMRFINDER_COLUMNS = [
+    '% Coverage of reference sequence', '% Identity to reference sequence',
+    'Accession of closest sequence', 'Alignment length', 'Class', 'Contig id',
+    'Element subtype', 'Element type', 'Gene symbol', 'HMM description', 'HMM id',
+    'Method', 'Name of closest sequence', 'Protein identifier',
+    'Reference sequence length', 'Scope', 'Sequence name', 'Start', 'Stop',
+    'Strand', 'Subclass', 'Target length']
+
 def parse_amrfinder(list_files):
     """
     Parse AMRFinder tool output from YAMLs, extracting AMR gene hits.
     Returns long-form DataFrame of gene hits per sample.
     """
-    d = {}
-    for file in list_files:
-        with open(file) as f:
-            data = yaml.load(f, Loader=yaml.Loader)
-            if data["status"] == "Success":
-                summary = data.get("summary", {}).get("output_tsv", [])
-                df = pd.DataFrame(summary)
-            else:
-                df = pd.DataFrame(np.nan, index=range(1), columns=[
-                    '% Coverage of reference sequence', '% Identity to reference sequence',
-                    'Accession of closest sequence', 'Alignment length', 'Class', 'Contig id',
-                    'Element subtype', 'Element type', 'Gene symbol', 'HMM description', 'HMM id',
-                    'Method', 'Name of closest sequence', 'Protein identifier',
-                    'Reference sequence length', 'Scope', 'Sequence name', 'Start', 'Stop',
-                    'Strand', 'Subclass', 'Target length'])
-            d[data["sample"]["name"]] = df
-    df = pd.concat(d, names=['Sample Name']).reset_index(level=0).set_index("Sample Name")
+    def parse_one(file):
+        data = _fast_yaml_load(file)
+        if data["status"] == "Success":
+            return data["sample"]["name"], data.get("summary", {}).get("output_tsv") or []
+        # Failed runs are kept as a single empty row
+        return data["sample"]["name"], [dict.fromkeys(AMRFINDER_COLUMNS, np.nan)]
+
+    d = _parallel_load(list_files, parse_one)
+    # One frame for all samples instead of a frame per sample plus a concat
+    rows = [{'Sample Name': name, **record} for name, summary in d.items() for record in summary]
+    if rows:
+        df = pd.DataFrame(rows).set_index("Sample Name")
+    else:
+        df = pd.DataFrame()
     return df
 
 
@@ -196,13 +363,13 @@ def parse_species(list_files):
     Parse Kraken-style species classification output.
     Adds custom column to compute unclassified + top-species proportion.
     """
-    d = {}
-    for file in list_files:
-        with open(file) as f:
-            data = yaml.load(f, Loader=yaml.Loader)
-            if data["status"] == "Success":
-                summary = data.get("summary", {})
-                d[data["sample"]["name"]] = summary
+    def parse_one(file):
+        data = _fast_yaml_load(file)
+        if data["status"] == "Success":
+            return data["sample"]["name"], data.get("summary", {})
+        return data["sample"]["name"], None
+
+    d = _parallel_load(list_files, parse_one)
     df = pd.DataFrame.from_dict(d, orient='index')
     df['sum_unclassified_species1'] = df['percent_unclassified'] + df['percent_classified_species_1']
     return df[[
@@ -212,57 +379,49 @@ def parse_species(list_files):
 
 
 
-def parse_finder_tools(list_files, ariba_type):
+def parse_finder_tools(list_files, ariba_type, min_cov=0, min_id=0):
     """
     Generic parser for ARIBA-style outputs (e.g., virulencefinder, plasmidfinder).
-    Dynamically adapts to the provided ARIBA result type.
+    Dynamically adapts to the provided ARIBA result type. Hits below min_cov
+    %COVERAGE or min_id %IDENTITY are dropped while parsing.
     """
-    data_df = {}
-
-    def extract_data(info):
-        extracted_data = []
-        if info:
-            for entry in info:
-                extracted_data.append({
-                    'GENE': entry.get('GENE', np.nan),
-                    '%COVERAGE': entry.get('%COVERAGE', np.nan),
-                    '%IDENTITY': entry.get('%IDENTITY', np.nan),
-                    'SEQUENCE': entry.get('SEQUENCE', np.nan),
-                    'START': entry.get('START', np.nan),
-                    'END': entry.get('END', np.nan),
-                    'DATABASE': entry.get('DATABASE', np.nan),
-                    'ACCESSION': entry.get('ACCESSION', np.nan)
-                })
-        else:
-            extracted_data.append({
-                'GENE': np.nan, '%COVERAGE': np.nan, '%IDENTITY': np.nan,
-                'SEQUENCE': np.nan, 'START': np.nan, 'END': np.nan,
-                'DATABASE': np.nan, 'ACCESSION': np.nan})
-        return extracted_data
-
-    for file in list_files:
-        with open(file) as f:
-            data = yaml.load(f, Loader=yaml.Loader)
-            sample_name = data["sample"]["name"]
-            if data.get("status") == "Success":
-                info = data["summary"].get(ariba_type, [])
-                data_df[sample_name] = extract_data(info)
-            else:
-                data_df[sample_name] = extract_data(None)
-
-    rows = []
-    for sample, entries in data_df.items():
-        for entry in entries:
-            rows.append((sample, entry['GENE'], entry['%COVERAGE'], entry['%IDENTITY'],
-                         entry['SEQUENCE'], entry['START'], entry['END'],
-                         entry['DATABASE'], entry['ACCESSION']))
-
-    df = pd.DataFrame(rows, columns=[
-        'Sample', 'GENE', '%COVERAGE', '%IDENTITY', 'SEQUENCE',
-        'START', 'END', 'DATABASE', 'ACCESSION'])
+    fields = ('GENE', '%COVERAGE', '%IDENTITY', 'SEQUENCE', 'START', 'END', 'DATABASE', 'ACCESSION')
+
+    def to_number(value):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return 0
+        return 0 if np.isnan(value) else value
+
+    def passes(entry):
+        return (to_number(entry.get('%COVERAGE')) >= min_cov
+                and to_number(entry.get('%IDENTITY')) >= min_id)
+
+    def parse_one(file):
+        data = _fast_yaml_load(file)
+        sample_name = data["sample"]["name"]
+        if data.get("status") == "Success":
+            return sample_name, data["summary"].get(ariba_type) or []
+        return sample_name, []
+
+    data_df = _parallel_load(list_files, parse_one)
+
+    # Fill the columns directly, samples without hits get a single empty row
+    # (which counts as 0 coverage and identity)
+    cols = {k: [] for k in ('Sample',) + fields}
+    for sample, info in data_df.items():
+        for entry in info or [{}]:
+            if not passes(entry):
+                continue
+            cols['Sample'].append(sample)
+            for k in fields:
+                cols[k].append(entry.get(k, np.nan))
+
+    df = pd.DataFrame(cols)
 
     df[['%COVERAGE', '%IDENTITY', 'START', 'END']] = df[[
-        '%COVERAGE', '%IDENTITY', 'START', 'END']].apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
+        '%COVERAGE', '%IDENTITY', 'START', 'END']].apply(pd.to_numeric, errors='coerce').fillna(0).astype(np.int32)
 
     df.set_index('Sample', inplace=True)
     return df
@@ -272,23 +431,24 @@ def parse_assemblatron(list_files):
     Parse genome assembly metrics from Assemblatron output YAMLs.
     Includes GC content, N50, contig counts, and genome sizes at depth.
     """
-    d = {}
-    for file in list_files:
-        with open(file) as f:
-            temp = yaml.load(f, Loader=yaml.Loader)
-            if temp["status"] == "Success":
-                d[temp["sample"]["name"]] = [
-                    temp["summary"]["GC"], temp["summary"]["N50"],
-                    temp["summary"]["bin_contigs_at_1x"],
-                    temp["summary"]["bin_contigs_at_10x"],
-                    temp["summary"]["bin_coverage_at_1x"],
-                    temp["summary"]["bin_length_at_1x"],
-                    temp["summary"]["bin_length_at_10x"],
-                    temp["summary"]["bin_length_at_25x"],
-                    temp["summary"]["snp_filter_10x_10%"]]
+    metrics = ["GC", "N50", "bin_contigs_at_1x", "bin_contigs_at_10x", "bin_coverage_at_1x",
+               "bin_length_at_1x", "bin_length_at_10x", "bin_length_at_25x", "snp_filter_10x_10%"]
+    keypaths = {("status",), ("sample", "name")} | {("summary", metric) for metric in metrics}
+
+    def parse_one(file):
+        temp = _extract_scalars(file, keypaths)
+        if temp.get(("status",)) != "Success":
+            return temp[("sample", "name")], None
+        return temp[("sample", "name")], [temp.get(("summary", metric)) for metric in metrics]
+
+    d = _parallel_load(list_files, parse_one)
 
     df = pd.DataFrame.from_dict(d, orient='index', columns=[
         "GC %", "N50", "Number of contigs (1x cov.)", "Number of contigs (10x cov.)",
         "Average coverage (1x)", "Genome size at 1x depth",
         "Genome size at 10x depth", "Genome size at 25x depth", "Ambiguous sites"])
-    return df
+    # GC and coverage are reported percentages/averages, the rest are counts
+    # and lengths that must not be rounded
+    dtypes = dict.fromkeys(df.columns, np.int64)
+    dtypes["GC %"] = dtypes["Average coverage (1x)"] = np.float64
+    return df.astype(dtypes)
@@ -2,97 +2,91 @@
 
 # Import necessary libraries
 import pandas as pd
-import matplotlib.pyplot as plt
 import os
 import re
+import textwrap
+import functools
+import multiprocessing
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
-def concatenate_vector(x, sep=","):
-    return ",".join([str(i) for i in x])
+# Splits an index label such as "RH_BTP_WGS_EQA_1" into its KMA and sample parts
+KMA_SAMPLE_PATTERN = re.compile(r"(.*_WGS)_(EQA_[0-9]+.*)")
 
+# Duplicated samples carry a -2 .. -9 suffix, so far RH is the only kma with duplicates
+DUPLICATE_SAMPLE_PATTERN = re.compile(r'.*-[2-9]')
+KMA_WITH_DUPLICATES = frozenset({'RH_BTP_WGS'})
 
+def _pyplot():
+    """
+        imports pyplot on first use, tables are only ever saved to file so default to the
+        non-interactive Agg backend (an explicit MPLBACKEND still wins)
+    """
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+@functools.lru_cache(maxsize=None)
+def analysis_csv_regex(analysis_type):
+    return re.compile(f'.*{re.escape(analysis_type)}.*csv')
 
 def parse_csvs(folder, analysis_type, rename_dict = None, sort_by = ''):
-    pd_dfs = [pd.read_csv(i, index_col=0) for i in os.listdir(folder) if re.match(f'.*{analysis_type}.*csv', i)]
-    ssi_df = pd_dfs[0].loc[pd_dfs[0].index.str.contains('SSI')]
-    pd_dfs = [i.loc[~i.index.str.contains('SSI')] for i in pd_dfs] # remove ssi duplicates form each of them
-    pd_dfs.append(ssi_df) # and readd the ssi df by itself
-    altered_dfs = []
-    for df in pd_dfs:
-        list_of_joined_dfs = []
-        if any(df.index.duplicated()): # case with multiple row values per sample, i.e. resistance genes
-            unique_indexes = pd.unique(df.index)
-            joined_vectors = []
-            for idx in unique_indexes:
-                pd_df_subset = df.loc[[idx]]
-                #print(pd_df_subset)
-                subset_as_frame = pd_df_subset.apply(concatenate_vector, axis=0).to_frame().T
-                subset_as_frame.rename(index={0:idx}, inplace=True)
-                joined_vectors.append(subset_as_frame)
-                #print(subset_as_frame)
-            joined_df = pd.concat(joined_vectors)
-            list_of_joined_dfs.append(joined_df)
-        else:
-            list_of_joined_dfs.append(df)
-        altered_dfs.append(pd.concat(list_of_joined_dfs))
-    concatenated_df = pd.concat(altered_dfs)
-    if rename_dict:
-        concatenated_df.rename(columns= rename_dict, inplace=True)
-    pattern = r"(.*_WGS)_(EQA_[0-9]+.*)"
-    kma_pattern_matches = [re.match(pattern, i).groups() for i in concatenated_df.index]
-    kmas = sorted(list(set(i[0] for i in kma_pattern_matches)))
-    samples = sorted(list(set(i[1] for i in kma_pattern_matches)))
-    # sort data frame
-    if sort_by:
-        concatenated_df = concatenated_df.sort_values(by=sort_by).sort_index()
-    return [concatenated_df, kmas, samples]
+    csv_regex = analysis_csv_regex(analysis_type)
+    with os.scandir(folder) as entries:
+        csv_paths = [entry.path for entry in entries if entry.is_file() and csv_regex.match(entry.name)]
+    pd_dfs = [pd.read_csv(i, index_col=0) for i in csv_paths]
+    return _parse_dfs(pd_dfs, rename_dict, sort_by)
 
 def parse_dfs(df_list, analysis_type, rename_dict = None, sort_by = ''):
-    pd_dfs = df_list # I copy pastaed this function from the other one because I was working with csvs locally originally
+    return _parse_dfs(df_list, rename_dict, sort_by)
+
+def _parse_dfs(pd_dfs, rename_dict = None, sort_by = ''):
+    """
+        shared by parse_csvs and parse_dfs, pd_dfs holds one frame per kma prefix
+    """
     ssi_df = pd_dfs[0].loc[pd_dfs[0].index.str.contains('SSI')]
     pd_dfs = [i.loc[~i.index.str.contains('SSI')] for i in pd_dfs] # remove ssi duplicates form each of them
     pd_dfs.append(ssi_df) # and readd the ssi df by itself
     altered_dfs = []
     for df in pd_dfs:
-        list_of_joined_dfs = []
-        if any(df.index.duplicated()): # case with multiple row values per sample, i.e. resistance genes
-            unique_indexes = pd.unique(df.index)
-            joined_vectors = []
-            for idx in unique_indexes:
-                pd_df_subset = df.loc[[idx]]
-                subset_as_frame = pd_df_subset.apply(concatenate_vector, axis=0).to_frame().T
-                subset_as_frame.rename(index={0:idx}, inplace=True)
-                joined_vectors.append(subset_as_frame)
-            joined_df = pd.concat(joined_vectors)
-            list_of_joined_dfs.append(joined_df)
-        else:
-            list_of_joined_dfs.append(df)
-        altered_dfs.append(pd.concat(list_of_joined_dfs))
+        if df.index.duplicated().any(): # case with multiple row values per sample, i.e. resistance genes
+            df = df.astype(str).groupby(level=0, sort=False).agg(','.join)
+        altered_dfs.append(df)
     concatenated_df = pd.concat(altered_dfs)
     if rename_dict:
         concatenated_df.rename(columns= rename_dict, inplace=True)
-    pattern = r"(.*_WGS)_(EQA_[0-9]+.*)"
-    kma_pattern_matches = [re.match(pattern, i).groups() for i in concatenated_df.index]
-    kmas = sorted(list(set(i[0] for i in kma_pattern_matches)))
-    samples = sorted(list(set(i[1] for i in kma_pattern_matches)))
+    kma_pattern_matches = concatenated_df.index.to_series().str.extract(KMA_SAMPLE_PATTERN).dropna()
+    kmas = sorted(kma_pattern_matches[0].unique().tolist())
+    samples = sorted(kma_pattern_matches[1].unique().tolist())
     # sort data frame
     if sort_by:
         concatenated_df = concatenated_df.sort_values(by=sort_by).sort_index()
+    # the genotype strings repeat a lot across kmas, store them as categories so equal
+    # values share one integer code. 'no_data' is added since it pads missing samples later.
+    # every column is converted (numeric ones too) so the colour matrix can compare codes
+    for col in concatenated_df.select_dtypes(exclude='category').columns:
+        categorical = concatenated_df[col].astype('category')
+        if 'no_data' not in categorical.cat.categories:
+            categorical = categorical.cat.add_categories('no_data')
+        concatenated_df[col] = categorical
     return [concatenated_df, kmas, samples]
 
 
 def anonymize_kma_df(input_df, kmas, kma_name):
     kma_remapped_names = {}
-    kma_count = list(range(1, len(kmas)))
-    kma_count.reverse() # this metho is in place
+    kma_count = 0
     for i in kmas:
         if i != kma_name and i != 'SSI_BTP_WGS':
-            kma_remapped_names[i] = 'other_kma_' + str(kma_count.pop())
+            kma_count += 1
+            kma_remapped_names[i] = 'other_kma_' + str(kma_count)
         else:
             kma_remapped_names[i] = i
-    anonymized_df = input_df.copy()
-    for i in kma_remapped_names.keys():
-        anonymized_df.index = anonymized_df.index.str.replace(i, kma_remapped_names[i])
+    anonymized_df = input_df.copy(deep = False) # only the index changes, so share the values with input_df
+    renames = {i: kma_remapped_names[i] for i in kma_remapped_names.keys() if i != kma_remapped_names[i]}
+    if renames:
+        # one pass over the index with a single alternation instead of a replace per kma
+        renames_regex = re.compile('|'.join(re.escape(i) for i in sorted(renames, key=len, reverse=True)))
+        anonymized_df.index = anonymized_df.index.str.replace(renames_regex, lambda m: renames[m.group(0)], regex=True)
     return [anonymized_df, kma_remapped_names]
 
 def create_kma_sample_df(anonymized_kma_df, kma_name, sample_name, kma_name_map):
@@ -103,23 +97,29 @@ def create_kma_sample_df(anonymized_kma_df, kma_name, sample_name, kma_name_map)
     other_kma_matches = list(anonymized_kma_df.index[anonymized_kma_df.index.str.contains(f"{kma_name}.*{sample_name[0:6]}")]) # match duplicates for the same kma
     other_kma_matches = [i for i in other_kma_matches if i!= kma_sample] # remove original element
     ssi_match = '_'.join(['SSI_BTP_WGS', sample_name[0:6]])
-    anon_kmas = [kma_name_map[i] for i in kma_name_map.keys() if re.match('other', kma_name_map[i])]
+    anon_kmas = [kma_name_map[i] for i in kma_name_map.keys() if kma_name_map[i].startswith('other')]
+    # one scan of the index for all anonymized kmas, longest names first so other_kma_10 is not taken for other_kma_1
+    matches_by_kma = {}
+    if anon_kmas:
+        anon_kmas_alternation = '|'.join(re.escape(i) for i in sorted(anon_kmas, key=len, reverse=True))
+        anon_regex = re.compile(f"({anon_kmas_alternation}).*{re.escape(sample_name[0:6])}")
+        matched_kmas = anonymized_kma_df.index.to_series().str.extract(anon_regex)[0].dropna()
+        for label, i in matched_kmas.items():
+            matches_by_kma.setdefault(i, []).append(label)
     other_samples = []
     for i in anon_kmas:
-        matches = list(anonymized_kma_df.index[anonymized_kma_df.index.str.contains(f"{i}.*{sample_name[0:6]}")]) # catch duplicates
+        matches = matches_by_kma.get(i, []) # catch duplicates
         kma_sample_base = '_'.join([i, sample_name[0:6]])
         if kma_sample_base not in matches:
             matches.append(kma_sample_base)
         other_samples += matches
     kma_samples = [kma_sample] + other_kma_matches + [ssi_match] + other_samples
-    for i in kma_samples:
-        if i not in anonymized_kma_df.index: # we want to catch missing data as well
-            #if kma_name not in KMA_WITH_DUPLICATES and re.match('.*-[2-9]', i): # enumerate the sample but skip if it's not the ones we know have duplicates
-                #continue
-            #else:
-            new_row = pd.Series(['no_data'] * anonymized_kma_df.shape[1], index=anonymized_kma_df.columns, name=i)
-            anonymized_kma_df = pd.concat([anonymized_kma_df, new_row.to_frame().T])
-    sub_df = anonymized_kma_df.loc[kma_samples]
+    # 'no_data' is already a category of the categorical columns, any other column (e.g.
+    # integer counts) can only hold it as object
+    non_categorical = [i for i, dtype in anonymized_kma_df.dtypes.items() if not isinstance(dtype, pd.CategoricalDtype)]
+    if non_categorical:
+        anonymized_kma_df = anonymized_kma_df.astype(dict.fromkeys(non_categorical, object))
+    sub_df = anonymized_kma_df.reindex(kma_samples, fill_value='no_data') # we want to catch missing data as well
     return sub_df
 
 def generate_color_matrix(input_df) -> np.array:
@@ -127,42 +127,50 @@ def generate_color_matrix(input_df) -> np.array:
         by the design the input to this function has
         row 0 = KMA being compared
     """
-    df_array = input_df.to_numpy()
-    reference_row = df_array[0, :]
-    #ssi_row = df_array[1, :]
-    #other_kma_rows = df_array[2:, :]
-    other_rows = df_array[1:, :]
-    color_matrix = np.full(df_array.shape, 'w')
+    if (input_df.dtypes == 'category').all():
+        # compare the integer category codes, -1 marks a missing value which never matches
+        codes = np.column_stack([input_df.iloc[:, j].cat.codes.to_numpy() for j in range(input_df.shape[1])])
+        matches = (codes == codes[0, :]) & (codes != -1)
+    else:
+        df_array = input_df.to_numpy()
+        matches = df_array == df_array[0, :]
+    # compare every row against row 0 in a single broadcast
+    color_matrix = np.where(matches, 'g', 'r')
     color_matrix [0, :] = 'cyan' # row being compared
-    for i in range(other_rows.shape[0]):
-        bool_array = reference_row == other_rows[i, :]
-        #print(bool_array.shape)
-        string_array = np.where(bool_array, 'g', 'r')
-        color_matrix[i+1, :] = string_array
     return color_matrix
 
 def append_metrics_to_df_and_cmat(input_df:pd.DataFrame, cmat:np.array, comparison_col:str = 'all', column_subset:list = []) -> list:
     reference_row = input_df.iloc[0]
     if column_subset:
-        col_idx = [input_df.columns.get_loc(i) for i in column_subset]
+        col_idx = input_df.columns.get_indexer(column_subset)
+        if (col_idx == -1).any():
+            raise KeyError(f"Columns not found: {[i for i, j in zip(column_subset, col_idx) if j == -1]}")
         input_df = input_df.iloc[:, col_idx].copy()
-        cmat = cmat[:, np.array(col_idx)].copy()
+        cmat = np.take(cmat, col_idx, axis = 1)
     if comparison_col == 'all':
-        matches = input_df.apply(lambda x: str(sum(x==reference_row)) + f'/{len(input_df.columns)}', axis = 1)
+        n_matches = (input_df.to_numpy() == reference_row.to_numpy()).sum(axis = 1)
+        matches = [f'{i}/{len(input_df.columns)}' for i in n_matches]
         #pct_match = input_df.apply(lambda x: str(sum(x==reference_row)/len(input_df.columns)), axis = 1)
         input_df['n_match'] = matches
         #input_df['pct_match'] = pct_match
     else:
         reference_vector = set(reference_row[comparison_col].split(','))
-        jcd = input_df[comparison_col].apply(lambda x: str(len(reference_vector.intersection(set(x.split(',')))) / len(reference_vector.union(set(x.split(','))))))
+        parts = [set(x) if isinstance(x, list) else set() for x in input_df[comparison_col].str.split(',').tolist()]
+        jcd = np.fromiter((len(reference_vector & x) / len(reference_vector | x) for x in parts),
+                          dtype=np.float64, count=len(parts)).astype(str)
         input_df['jaccard'] = jcd
-    #print(input_df.shape, cmat_extension.shape
-    cmat_extension = color_matrix = np.full((len(input_df.index), input_df.shape[1] - cmat.shape[1]), 'w')
-    #print(cmat_extension)
-    cmat = np.concatenate([cmat, cmat_extension], axis = 1)
+    n_extra_cols = input_df.shape[1] - cmat.shape[1] # metric columns added above are left white
+    if n_extra_cols > 0:
+        cmat_extension = np.full((len(input_df.index), n_extra_cols), 'w', dtype = cmat.dtype)
+        cmat = np.concatenate([cmat, cmat_extension], axis = 1)
     return [input_df, cmat]
 
-def generate_table(df, cmat, path, figsize = (10,5), max_width=70, fontsize=10, row_height=0.2, shorten=False):
+def generate_table(df, cmat, path, figsize = (10,5), max_width=70, fontsize=10, row_height=0.2, shorten=False, ax=None):
+    """
+        draws df as a table coloured by cmat and saves it to path. When ax is given the
+        table is drawn on it (after clearing it) and its figure is reused instead of
+        creating and closing a new one
+    """
     columns = df.columns
     rows = df.index
 
@@ -173,8 +181,14 @@ def generate_table(df, cmat, path, figsize = (10,5), max_width=70, fontsize=10,
     # Add a table at the bottom of the axes
     colors = cmat
     
-    fig, ax = plt.subplots()
-    fig.set_size_inches(*figsize)
+    owns_figure = ax is None
+    if owns_figure:
+        plt = _pyplot()
+        fig, ax = plt.subplots()
+        fig.set_size_inches(*figsize)
+    else:
+        fig = ax.figure
+        ax.cla()
     #plt.figure(figsize=(30, 19))
     ax.axis('tight')
     ax.axis('off')
@@ -184,11 +198,12 @@ def generate_table(df, cmat, path, figsize = (10,5), max_width=70, fontsize=10,
     
     #fig.set_size_inches(20,10)
     #plt.show()
-    plt.savefig(path, dpi=300)
-    plt.close()
+    fig.savefig(path, dpi=300)
+    if owns_figure:
+        plt.close(fig)
 
 def generate_concatenated_dfs_for_a_kma(kma_list:list, kma_name:str, input_df:pd.DataFrame, sample_names, concatenate = True):
-    anonymized_df, kma_name_map = anonymize_kma_df(input_df, kmas, kma_name)
+    anonymized_df, kma_name_map = anonymize_kma_df(input_df, kma_list, kma_name)
     kma_sample_dfs = []
     color_matrices = []
     for sample in sample_names:
@@ -199,8 +214,7 @@ def generate_concatenated_dfs_for_a_kma(kma_list:list, kma_name:str, input_df:pd
         color_matrix = generate_color_matrix(kma_sample_df)
         kma_sample_df_extended, color_matrix_extended = append_metrics_to_df_and_cmat(kma_sample_df, color_matrix)
         kma_sample_dfs.append(kma_sample_df_extended)
-    concatenated_df = pd.concat(kma_sample_dfs, axis = 0)
-    concatenated_colors = np.concatenate(color_matrices, axis = 0)
+        color_matrices.append(color_matrix_extended)
     if concatenate:
         return dict(df = pd.concat(kma_sample_dfs, axis = 0), cmat = np.concatenate(color_matrices, axis = 0))
     else:
@@ -208,16 +222,35 @@ def generate_concatenated_dfs_for_a_kma(kma_list:list, kma_name:str, input_df:pd
 
 def spam_tables(parsed_df:pd.DataFrame, samples:list, kmas:list, kma:str, comparison_col:str, column_subset:list, output_folder:str, analysis_type:str, file_ending='.png'):
     anonymized_df, kma_name_map = anonymize_kma_df(parsed_df, kmas, kma)
-    for sample in samples:
-        if kma not in ['RH_BTP_WGS'] and bool(re.match('.*-[2-9]', sample)): # so far RH is the only one with duplicates
-            #print(kma, sample)
-            continue # we don't want to loop over kma_samples that don't have duplicates
-        kma_sample_df = create_kma_sample_df(anonymized_df, kma, sample, kma_name_map)
-        cmat = generate_color_matrix(kma_sample_df)
-        extended_df, extended_cmat = append_metrics_to_df_and_cmat(kma_sample_df, cmat, comparison_col, column_subset)
-        output_file_name = os.path.join(output_folder, '_'.join([kma, analysis_type, sample]) + file_ending) 
-        generate_table(extended_df, extended_cmat, output_file_name, figsize = (15, 5))
-
-def spam_tables_for_all_kmas(parsed_df:pd.DataFrame, samples:list, kmas:list, comparison_col:str, column_subset:list, output_folder:str, analysis_type:str, file_ending='.png'):
-    for kma in kmas:
-        spam_tables(parsed_df, samples, kmas, kma, comparison_col, column_subset, output_folder, analysis_type, file_ending)
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize = (15, 5)) # one figure shared by all the tables of this kma
+    try:
+        for sample in samples:
+            if kma not in KMA_WITH_DUPLICATES and DUPLICATE_SAMPLE_PATTERN.match(sample):
+                #print(kma, sample)
+                continue # we don't want to loop over kma_samples that don't have duplicates
+            kma_sample_df = create_kma_sample_df(anonymized_df, kma, sample, kma_name_map)
+            cmat = generate_color_matrix(kma_sample_df)
+            extended_df, extended_cmat = append_metrics_to_df_and_cmat(kma_sample_df, cmat, comparison_col, column_subset)
+            output_file_name = os.path.join(output_folder, '_'.join([kma, analysis_type, sample]) + file_ending) 
+            generate_table(extended_df, extended_cmat, output_file_name, figsize = (15, 5), ax = ax)
+    finally:
+        plt.close(fig)
+
+def spam_tables_for_all_kmas(parsed_df:pd.DataFrame, samples:list, kmas:list, comparison_col:str, column_subset:list, output_folder:str, analysis_type:str, file_ending='.png', workers=None):
+    """
+        renders the tables of every kma, one kma per worker process since they share no state.
+        workers defaults to the number of cpus, workers=1 renders everything in this process.
+        the workers are spawned rather than forked, forking would copy the threads of the
+        file-loading pool in data_processing which can deadlock the child
+    """
+    if workers == 1:
+        for kma in kmas:
+            spam_tables(parsed_df, samples, kmas, kma, comparison_col, column_subset, output_folder, analysis_type, file_ending)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(spam_tables, parsed_df, samples, kmas, kma, comparison_col, column_subset, output_folder, analysis_type, file_ending)
+                   for kma in kmas]
+        for future in futures:
+            future.result() # re-raise errors from the workers
+